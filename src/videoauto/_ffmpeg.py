@@ -0,0 +1,279 @@
+"""
+ffmpeg_cut_select.py / ffmpeg_cut_trim.py / srt_to_voice.py 共用的 FFmpeg 辅助函数
+
+响度标准化（测量 + 线性应用）：
+    - 单遍 loudnorm 需要边处理边估计响度，走动态（逐帧自适应增益）路径，CPU 开销大
+    - 先用 ebur128 只对选中的音频测量一遍 I/LRA/TP/Threshold（不解码视频，很快）
+    - 再把测量值传给 loudnorm 并开启 linear=true，只做线性增益，跳过动态路径
+    - 注意：线性增益后峰值会超过 TP 目标时（测量 TP + 增益 > 目标 TP，如音量很小的原始人声），
+      或测量 LRA 超过目标 LRA（或为 0）时，loudnorm 会自动退回动态模式，
+      此时没有 CPU 节省，各段分别处理也会在分段处产生响度跳变
+
+NVENC 编码参数（nvenc_args）：
+    - 预设 p1 最快、p7 质量最好，p1 编码速度约为 p4 的 2 倍，质量损失很小
+    - CBR 注重速度，默认 p2 + tune ll（低延迟，不使用 B 帧）；VBR 注重质量，默认 p4
+    - VBR 且 cq <= 20（高质量）时使用全分辨率多遍编码
+
+子进程启动（popen）：
+    - 默认的 fork + exec 需要复制父进程页表，父进程持有大量音频数据时每次启动都会卡顿
+    - 满足条件时 CPython 改用 posix_spawn（vfork 方式）启动子进程：
+      可执行文件为带目录的路径、close_fds=False、无 preexec_fn/pass_fds/cwd 等
+    - Python 创建的文件描述符默认不可继承，close_fds=False 不会泄漏到子进程
+"""
+
+import collections
+import functools
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+# 目标响度：EBU R128
+TARGET_I = -16.0
+TARGET_TP = -1.5
+TARGET_LRA = 11.0
+LOUDNORM_TARGET = f"I={TARGET_I:g}:TP={TARGET_TP:g}:LRA={TARGET_LRA:g}"
+
+# ebur128 结束时输出的 Summary，例如：
+#   Integrated loudness:
+#     I:         -19.7 LUFS
+#     Threshold: -30.1 LUFS
+#   Loudness range:
+#     LRA:         8.5 LU
+#   ...
+#   True peak:
+#     Peak:        -0.5 dBFS
+_EBUR128_SUMMARY_RE = re.compile(
+    r"I:\s+(?P<I>-?(?:inf|[\d.]+)) LUFS\s+"
+    r"Threshold:\s+(?P<thresh>-?(?:inf|[\d.]+)) LUFS"
+    r".*?LRA:\s+(?P<LRA>-?(?:inf|[\d.]+)) LU"
+    r".*?Peak:\s+(?P<TP>-?(?:inf|[\d.]+)) dBFS",
+    re.S,
+)
+
+# loudnorm measured_* 参数的取值范围
+_MEASURED_RANGE = {
+    "I": (-99.0, 0.0),
+    "TP": (-99.0, 99.0),
+    "LRA": (0.0, 99.0),
+    "thresh": (-99.0, 0.0),
+}
+
+
+# NVENC 编码预设与 tune
+NVENC_PRESETS = [f"p{i}" for i in range(1, 8)]
+NVENC_TUNES = ["hq", "ll", "ull"]
+
+
+def add_nvenc_arguments(parser) -> None:
+    """为命令行添加 --preset / --tune 参数"""
+    parser.add_argument("--preset", choices=NVENC_PRESETS, default=None,
+                        help="NVENC 编码预设，p1 最快、p7 质量最好（默认 CBR 为 p2，VBR 为 p4）")
+    parser.add_argument("--tune", choices=NVENC_TUNES, default=None,
+                        help="NVENC tune（默认 CBR 为 ll 低延迟，VBR 为 hq）")
+
+
+def nvenc_args(
+    preset: Optional[str] = None,
+    tune: Optional[str] = None,
+    vbr: bool = False,
+    cq: int = 23,
+    bitrate: str = "10M",
+) -> List[str]:
+    """
+    构建 h264_nvenc 的预设、tune 和码率控制参数
+
+    Args:
+        preset: 编码预设 p1-p7（默认 CBR 为 p2，VBR 为 p4）
+        tune: hq/ll/ull（默认 CBR 为 ll，VBR 使用编码器默认值）
+        vbr: 是否使用 VBR 可变码率模式
+        cq: VBR 模式的质量参数 (0-51)，值越小质量越高
+        bitrate: CBR 模式的视频比特率
+
+    Returns:
+        放在 -c:v h264_nvenc 之后的参数列表
+    """
+    if preset is None:
+        preset = "p4" if vbr else "p2"
+    if tune is None and not vbr:
+        tune = "ll"
+    args = ["-preset", preset]
+    if tune:
+        args.extend(["-tune", tune])
+    logging.info(f"NVENC 预设: {preset}, tune: {tune or '默认'}")
+
+    # 码率控制模式
+    if vbr:
+        # VBR 可变码率：文件更小，质量稳定
+        args.extend(["-rc", "vbr", "-cq", str(cq)])
+        # 高质量时使用全分辨率多遍编码
+        if cq <= 20:
+            args.extend(["-multipass", "fullres"])
+        logging.info(f"使用 VBR 模式 (cq={cq})")
+    else:
+        # CBR 恒定码率：兼容性更好
+        args.extend(["-b:v", bitrate])
+        logging.info(f"使用 CBR 模式 (bitrate={bitrate})")
+    return args
+
+
+@functools.lru_cache(maxsize=None)
+def _which(program: str) -> str:
+    """解析可执行文件的完整路径（posix_spawn 要求带目录的路径），找不到时原样返回"""
+    return shutil.which(program) or program
+
+
+def popen(cmd: List[str], **kwargs) -> subprocess.Popen:
+    """
+    启动子进程，尽量走 posix_spawn 而不是 fork
+
+    传入 cwd 时 CPython 会退回 fork + exec，行为不变。
+    """
+    return subprocess.Popen(
+        [_which(cmd[0])] + list(cmd[1:]),
+        close_fds=False,
+        env=os.environ,
+        **kwargs,
+    )
+
+
+def escape_filter_path(path: str) -> str:
+    """
+    把文件路径转义为 filtergraph 中的滤镜参数（如 amovie=...）
+
+    需要两层转义：先按滤镜参数转义 \\ ' :，再按 filtergraph 转义 \\ ' [ ] , ;。
+    Windows 路径的反斜杠先换成 /（FFmpeg 均可识别）。
+    """
+    path = os.path.abspath(path).replace("\\", "/")
+    for char in "\\':":
+        path = path.replace(char, "\\" + char)
+    for char in "\\'[],;":
+        path = path.replace(char, "\\" + char)
+    return path
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    error_message: str = "FFmpeg 处理失败",
+    tail_lines: int = 200,
+) -> str:
+    """
+    运行 FFmpeg，后台线程持续读取 stderr，只保留最后 tail_lines 行
+
+    capture_output=True 会把整个 stderr 缓存到进程结束，长视频时占用大量内存；
+    这里边读边丢弃，只保留末尾用于报错和解析输出。
+
+    Args:
+        cmd: FFmpeg 命令
+        error_message: 失败时 RuntimeError 的提示
+        tail_lines: 保留的 stderr 行数
+
+    Returns:
+        stderr 的最后 tail_lines 行
+    """
+    tail = collections.deque(maxlen=tail_lines)
+    process = popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    drainer = threading.Thread(target=tail.extend, args=(process.stderr,), daemon=True)
+    drainer.start()
+    process.wait()
+    drainer.join()
+    process.stderr.close()
+
+    output = "".join(tail)
+    if process.returncode != 0:
+        logging.error(f"FFmpeg 错误: {output}")
+        raise RuntimeError(f"{error_message}: {output}")
+    return output
+
+
+def measure_loudness(input_file: str, audio_graph: str, filter_script: str) -> Dict[str, float]:
+    """
+    使用 ebur128 测量音频响度
+
+    Args:
+        input_file: 输入文件路径
+        audio_graph: 音频部分的 filter_complex（最后一个滤镜不带输出标签）
+        filter_script: 写入测量用 filter_complex 的临时文件路径
+
+    Returns:
+        {"I", "TP", "LRA", "thresh"} 测量值，已限制在 loudnorm 可接受的范围内
+    """
+    # framelog=verbose: 逐帧日志降到 verbose 级别，stderr 只保留 Summary
+    with open(filter_script, "w", encoding="utf-8") as f:
+        f.write(f"{audio_graph},ebur128=peak=true:framelog=verbose[outa]")
+
+    cmd = [
+        "ffmpeg", "-nostats",
+        "-i", input_file,
+        "-filter_complex_script", filter_script,
+        "-map", "[outa]",
+        "-f", "null", "-",
+    ]
+
+    logging.info("测量音频响度...")
+    output = run_ffmpeg(cmd, "FFmpeg 响度测量失败")
+
+    # 只解析最后一个 Summary
+    match = _EBUR128_SUMMARY_RE.search(output.rsplit("Summary:", 1)[-1])
+    if match is None:
+        raise RuntimeError(f"无法解析 ebur128 输出: {output}")
+
+    measured = {}
+    for key, (low, high) in _MEASURED_RANGE.items():
+        measured[key] = min(max(float(match.group(key)), low), high)
+
+    logging.info(
+        f"响度测量结果: I={measured['I']} LUFS, TP={measured['TP']} dBFS, "
+        f"LRA={measured['LRA']} LU, Threshold={measured['thresh']} LUFS"
+    )
+    return measured
+
+
+def loudnorm_is_linear(measured: Dict[str, float]) -> bool:
+    """
+    判断 loudnorm 能否保持线性模式
+
+    与 loudnorm 内部的判断一致，以下条件都满足时才保持线性，否则退回动态模式：
+    - 测量值有效（TP 不为 99，thresh 不为 -70）
+    - 线性增益后的峰值（测量 TP + 增益）不超过目标 TP
+    - 测量 LRA 大于 0 且不超过目标 LRA
+    """
+    return not _dynamic_reasons(measured)
+
+
+def _dynamic_reasons(measured: Dict[str, float]) -> List[str]:
+    """loudnorm 无法保持线性模式的原因，为空表示可以保持线性"""
+    reasons = []
+    if measured["TP"] == 99 or measured["thresh"] == -70:
+        reasons.append("测量值无效")
+    gain = TARGET_I - measured["I"]
+    if measured["TP"] + gain > TARGET_TP:
+        reasons.append(f"线性增益 {gain:.1f} dB 后峰值将超过 {TARGET_TP} dBFS")
+    if not 0 < measured["LRA"] <= TARGET_LRA:
+        reasons.append(f"响度范围 LRA={measured['LRA']} LU 不在 (0, {TARGET_LRA}] 内")
+    return reasons
+
+
+def loudnorm_filter(measured: Dict[str, float]) -> str:
+    """根据测量值构建线性 loudnorm 滤镜（无法保持线性时给出警告）"""
+    reasons = _dynamic_reasons(measured)
+    if reasons:
+        logging.warning(f"{'，'.join(reasons)}，loudnorm 将退回动态模式（处理更慢）")
+    return (
+        f"loudnorm={LOUDNORM_TARGET}"
+        f":measured_I={measured['I']}"
+        f":measured_TP={measured['TP']}"
+        f":measured_LRA={measured['LRA']}"
+        f":measured_thresh={measured['thresh']}"
+        f":linear=true:print_format=summary"
+    )
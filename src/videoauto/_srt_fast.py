@@ -0,0 +1,112 @@
+"""
+SRT 快速解析/生成，各模块统一使用（替代 srt 库）
+
+srt 库为每个时间戳构造 timedelta，解析和生成都要逐行做大量 Python 运算，
+字幕较多（长视频）时耗时明显。这里使用预编译正则一次匹配所有字幕块，
+时间戳直接转换为毫秒整数数组，生成时直接格式化整数，不创建 datetime 对象。
+正则只在导入时编译一次，各模块共用。
+"""
+
+import re
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# 时间戳各字段的分隔符，与 srt 库一致（含中文 SRT 常见的全角 ，．。：）
+DELIM = r"[,.:，．。：]"
+
+# 时间戳：时:分:秒,毫秒（毫秒可省略）
+TIMESTAMP = rf"(\d+){DELIM}(\d+){DELIM}(\d+){DELIM}?(\d*)"
+_TIMESTAMP_NOGROUP = rf"\d+{DELIM}\d+{DELIM}\d+{DELIM}?\d*"
+
+# 序号行（与 srt 库一致，允许 -1、12.0 这类不规范序号）
+_INDEX_LINE = r"[ \t]*-?\d+\.?\d*[ \t]*\n"
+
+# 内容结束的位置：空行、文件末尾，或紧跟着的下一个「序号行 + 时间戳」（部分字幕块之间缺少空行）
+_CONTENT_STOP = rf"[ \t]*(?:\n|\Z)|{_INDEX_LINE}[ \t]*{_TIMESTAMP_NOGROUP}"
+
+# 字幕块：序号行（可省略）、时间行、内容（可为空）
+# 内容按整行匹配，每行只检查一次是否到达结束位置，不逐字符尝试前瞻
+BLOCK_RE = re.compile(
+    rf"^(?:{_INDEX_LINE})?"
+    rf"[ \t]*{TIMESTAMP}[ \t]*-[ -][ \t]*>[ \t]*{TIMESTAMP}[^\n]*"
+    rf"(?:\n((?!{_CONTENT_STOP})[^\n]*(?:\n(?!{_CONTENT_STOP})[^\n]*)*))?",
+    re.M,
+)
+
+
+class SRTParseError(ValueError):
+    """SRT 中有无法解析的内容（如时间行写错），与 srt.SRTParseError 对应"""
+
+
+# 时:分:秒,毫秒 -> 毫秒
+_TS_WEIGHTS = np.array([3600000, 60000, 1000, 1], dtype=np.int64)
+
+
+def parse_arrays(text: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    解析 SRT 文本
+
+    Returns:
+        (start_ms, end_ms, contents)：开始/结束时间（毫秒，np.int64）和字幕内容，按文件顺序
+    """
+    text = text.lstrip("\ufeff").replace("\r\n", "\n")
+
+    # 与 srt.parse 一致：字幕块之间只能是空白，否则抛出 SRTParseError，不静默丢弃字幕
+    matches = []
+    pos = 0
+    for match in BLOCK_RE.finditer(text):
+        _check_unparsed(text, pos, match.start())
+        matches.append(match.groups())
+        pos = match.end()
+    _check_unparsed(text, pos, len(text))
+
+    if not matches:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+
+    # 所有时间字段拼成一个字符串后一次转换为整数（省略的毫秒记为 0）
+    digits = " ".join(field or "0" for m in matches for field in m[:8])
+    fields = np.fromstring(digits, dtype=np.int64, sep=" ").reshape(-1, 8)
+    start_ms = fields[:, :4] @ _TS_WEIGHTS
+    end_ms = fields[:, 4:] @ _TS_WEIGHTS
+    contents = [m[8] or "" for m in matches]
+    return start_ms, end_ms, contents
+
+
+def _check_unparsed(text: str, start: int, end: int) -> None:
+    """字幕块之间（start:end）有非空白内容时抛出 SRTParseError"""
+    unparsed = text[start:end]
+    if unparsed.strip():
+        line = text.count("\n", 0, start) + 1
+        raise SRTParseError(f"第 {line} 行附近有无法解析的 SRT 内容: {unparsed.strip()[:200]!r}")
+
+
+def parse(text: str) -> List[Tuple[int, int, str]]:
+    """解析 SRT 文本，返回 (start_ms, end_ms, content) 列表，按文件顺序"""
+    start_ms, end_ms, contents = parse_arrays(text)
+    return list(zip(start_ms.tolist(), end_ms.tolist(), contents))
+
+
+def format_timestamp(ms: int) -> str:
+    """毫秒 -> SRT 时间戳，如 01:23:04,000"""
+    secs, ms = divmod(ms, 1000)
+    mins, secs = divmod(secs, 60)
+    hrs, mins = divmod(mins, 60)
+    return "%02d:%02d:%02d,%03d" % (hrs, mins, secs, ms)
+
+
+def compose(entries: Iterable[Tuple[int, int, str]]) -> str:
+    """
+    生成 SRT 文本
+
+    与 srt.compose 一致：按开始时间排序并重新编号，
+    跳过内容为空、开始时间为负或开始时间不早于结束时间的字幕。
+    """
+    blocks = []
+    for start, end, content in sorted(entries, key=lambda x: (x[0], x[1])):
+        if not content.strip() or start < 0 or start >= end:
+            continue
+        blocks.append(
+            f"{len(blocks) + 1}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{content}\n\n"
+        )
+    return "".join(blocks)
@@ -9,11 +9,16 @@ FFmpeg 视频剪辑工具 - 使用 select + aselect 方案
     5. 音频响度标准化 (loudnorm)
 
 实现方案：
+    - 先用 ebur128 测量选中音频的响度，再以 linear=true 模式应用 loudnorm
     - 使用 FFmpeg 的 select/aselect 滤镜一次性选择所有需要的帧
     - 相比 trim + concat 方案，select 更容易保持音视频同步
-    - CPU：解码 + 滤镜处理（select不支持硬件加速）
+    - GPU (NVDEC)：解码，帧留在显存中，select 选中后才 hwdownload 回内存
+    - CPU：滤镜处理（select 按时间戳选择，只下载保留的帧）
     - GPU (nvenc)：编码（占70%处理时间）
     - 使用 filter_complex_script 避免命令行过长
+    - 按时长将片段分为 K 组，K 个 ffmpeg 进程各自 -ss 定位并编码一组，
+      最后用 concat demuxer 直接复制视频流拼接（NVENC 会话/解码器并行）
+    - NVENC 预设可选 p1-p7，默认 CBR 使用 p2 + tune ll，VBR 使用 p4（见 _ffmpeg.nvenc_args）
     - 支持 VBR (可变码率，剪辑更耗CPU) 和 CBR (恒定码率) 两种模式
 
 效果：
@@ -22,18 +27,23 @@ FFmpeg 视频剪辑工具 - 使用 select + aselect 方案
     - VBR 模式文件更小，CBR 模式兼容性更好
 
 关键滤镜说明：
-    - select='between(t,0,5)+between(t,10,15)': 选择 0-5s 和 10-15s 的视频帧
+    - select='if(lt(t,10),between(t,0,5),between(t,10,15))': 选择 0-5s 和 10-15s 的视频帧
+      （片段按开始时间二分嵌套，每帧只需 O(log N) 次比较）
     - aselect: 同上，用于音频
     - setpts=N/FRAME_RATE/TB: 重建视频时间戳，保证连续播放
     - asetpts=N/SR/TB: 重建音频时间戳
-    - loudnorm=I=-16:TP=-1.5:LRA=11: EBU R128 响度标准化
-    - format=yuv420p: 确保输出格式兼容
+    - ebur128=peak=true: 测量响度（I/LRA/TP/Threshold）
+    - loudnorm=I=-16:TP=-1.5:LRA=11:measured_I=...:linear=true: EBU R128 线性响度标准化
+    - hwdownload,format=nv12: 硬件解码时将选中的帧拷贝回内存
+    - format=yuv420p: 确保输出格式兼容（CPU 解码时）
 
 使用方法：
     python -m videoauto.ffmpeg_cut_select video.mp4 video.srt
     python -m videoauto.ffmpeg_cut_select video.mp4 video.srt -o output.mp4
     python -m videoauto.ffmpeg_cut_select video.mp4 video.srt --vbr --cq 23
     python -m videoauto.ffmpeg_cut_select video.mp4 video.srt --bitrate 15M
+    python -m videoauto.ffmpeg_cut_select video.mp4 video.srt -j 1
+    python -m videoauto.ffmpeg_cut_select video.mp4 --pad 0.1 --sync-srt
 
 关于aselect 不生效的临时规避：
     ffmpeg 8.0 版本中，aslect滤镜忘了active，临时使用master版本。
@@ -41,41 +51,172 @@ FFmpeg 视频剪辑工具 - 使用 select + aselect 方案
     [#20949 - Fixed broken aselect filter - FFmpeg/FFmpeg - FFmpeg Forgejo](https://code.ffmpeg.org/FFmpeg/FFmpeg/pulls/20949/commits)
 """
 
+import functools
 import logging
 import os
 import shutil
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
-import srt
+from videoauto._ffmpeg import (
+    add_nvenc_arguments,
+    loudnorm_filter,
+    loudnorm_is_linear,
+    measure_loudness,
+    nvenc_args,
+    popen,
+    run_ffmpeg,
+)
+from videoauto._srt_fast import compose
+from videoauto.srt_pipeline import load, merge_segments, plan, sort_by_start
 
 
 def parse_srt_segments(srt_file: str, encoding: str = "utf-8") -> List[Dict[str, float]]:
     """解析 SRT 文件，提取时间片段并合并相邻片段"""
-    with open(srt_file, encoding=encoding) as f:
-        subs = list(srt.parse(f.read()))
-
-    segments = []
-    subs.sort(key=lambda x: x.start)
-
-    for x in subs:
-        if len(segments) == 0:
-            segments.append({
-                "start": x.start.total_seconds(),
-                "end": x.end.total_seconds()
-            })
-        else:
-            # 合并间隔小于 0.5 秒的片段
-            if x.start.total_seconds() - segments[-1]["end"] < 0.5:
-                segments[-1]["end"] = x.end.total_seconds()
-            else:
-                segments.append({
-                    "start": x.start.total_seconds(),
-                    "end": x.end.total_seconds()
-                })
-
-    return segments
+    start_ms, end_ms, _ = sort_by_start(*load(srt_file, encoding))
+    return merge_segments(start_ms, end_ms)
+
+
+@functools.lru_cache(maxsize=32)
+def _probe_fps(path: str, mtime: float) -> str:
+    """
+    获取视频帧率，格式如 "60/1" 或 "30000/1001"
+
+    按 (path, mtime) 缓存，同一文件只调用一次 ffprobe，文件修改后自动失效。
+    ffprobe 失败时抛出 RuntimeError，失败结果不会被缓存。
+    """
+    probe_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=r_frame_rate",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path
+    ]
+    process = popen(probe_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stdout, stderr = process.communicate()
+    fps = stdout.strip()
+    if process.returncode != 0 or not fps:
+        logging.error(f"ffprobe 错误: {stderr}")
+        raise RuntimeError(f"无法获取视频帧率: {path}")
+    return fps
+
+
+def build_select_expr(segments: List[Dict[str, float]]) -> str:
+    """
+    构建 select/aselect 表达式
+
+    片段按时间排序且互不重叠，按开始时间二分构建 if(lt(t,MID),LEFT,RIGHT)，
+    每帧只需计算 O(log N) 次比较，而不是把 N 个 between() 相加逐个计算。
+    """
+    if len(segments) == 1:
+        seg = segments[0]
+        return f"between(t,{seg['start']},{seg['end']})"
+
+    mid = len(segments) // 2
+    left = build_select_expr(segments[:mid])
+    right = build_select_expr(segments[mid:])
+    return f"if(lt(t,{segments[mid]['start']}),{left},{right})"
+
+
+def split_segments(segments: List[Dict[str, float]], jobs: int) -> List[List[Dict[str, float]]]:
+    """按时长将片段切分为最多 jobs 组连续片段，每组时长大致相等"""
+    total_duration = sum(seg["end"] - seg["start"] for seg in segments)
+    buckets = [[]]
+    elapsed = 0.0
+
+    for seg in segments:
+        duration = seg["end"] - seg["start"]
+        # 片段中点越过当前组的目标时长时，开始新的一组
+        if buckets[-1] and len(buckets) < jobs and elapsed + duration / 2 >= total_duration * len(buckets) / jobs:
+            buckets.append([])
+        buckets[-1].append(seg)
+        elapsed += duration
+
+    return buckets
+
+
+def _encode(
+    input_video: str,
+    segments: List[Dict[str, float]],
+    output_video: str,
+    filter_script: str,
+    fps: str,
+    loudnorm: str,
+    video_args: List[str],
+    audio_args: List[str],
+    hwdec: bool = True,
+    seek: bool = False,
+) -> None:
+    """
+    使用 select/aselect 滤镜编码一组片段
+
+    seek=True 时先用 -ss/-t 定位到这组片段所在的时间范围，只解码这一段，
+    用于并行编码时每个进程处理其中一组片段。
+    硬件解码失败时自动改用 CPU 解码重试一次。
+    """
+    # 构建 FFmpeg 命令
+    cmd = ["ffmpeg", "-y", "-nostats"]
+
+    # NVDEC 硬件解码，解码后的帧直接留在显存 (AV_PIX_FMT_CUDA)
+    if hwdec:
+        cmd.extend(["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"])
+
+    selected = segments
+    if seek:
+        offset = segments[0]["start"]
+        cmd.extend(["-ss", str(offset), "-t", str(round(segments[-1]["end"] - offset, 6))])
+        # 定位后时间戳从 0 开始，片段时间同步前移
+        selected = [
+            {"start": round(seg["start"] - offset, 6), "end": round(seg["end"] - offset, 6)}
+            for seg in segments
+        ]
+
+    select_expr = build_select_expr(selected)
+
+    # 构建 filter_complex
+    # fps: 将 VFR 转为 CFR，确保 select 按时间戳正确选择帧（使用原始帧率）
+    # aresample=44100: 在 loudnorm 后重采样，避免输出 96kHz
+    # 硬件解码时 fps/select/setpts 只处理时间戳，直接作用于显存中的帧，
+    # 选中后再 hwdownload，只有保留的帧才会拷贝回内存；nvenc 直接接受 nv12
+    video_format = "hwdownload,format=nv12" if hwdec else "format=yuv420p"
+    filter_complex = (
+        f"[0:v]fps={fps},select='{select_expr}',setpts=N/FRAME_RATE/TB,{video_format}[outv];"
+        f"[0:a]aselect='{select_expr}',asetpts=N/SR/TB,{loudnorm},aresample=44100[outa]"
+    )
+
+    with open(filter_script, "w", encoding="utf-8") as f:
+        f.write(filter_complex)
+
+    cmd.extend([
+        "-i", input_video,
+        "-filter_complex_script", filter_script,
+        "-map", "[outv]",
+        "-map", "[outa]",
+        "-c:v", "h264_nvenc",
+        "-r", "30", # 输出固定30fps减小文件大小
+    ])
+    cmd.extend(video_args)
+
+    #  faststart 优化，流媒体友好
+    cmd.extend(["-max_muxing_queue_size", "1024"])
+
+    # 音频编码（采样率已在滤镜中处理）
+    cmd.extend(audio_args)
+    cmd.append(output_video)
+
+    try:
+        run_ffmpeg(cmd)
+    except RuntimeError:
+        if not hwdec:
+            raise
+        # NVDEC 不支持的格式（如 H.264 High10/4:2:2）会退回软件解码，hwdownload 无法配置
+        logging.warning("NVDEC 硬件解码失败（可能不支持该视频的编码格式），改用 CPU 解码重试")
+        _encode(
+            input_video, segments, output_video, filter_script,
+            fps, loudnorm, video_args, audio_args, False, seek,
+        )
 
 
 def cut_video(
@@ -86,6 +227,12 @@ def cut_video(
     bitrate: str = "10M",
     vbr: bool = False,
     cq: int = 23,
+    hwdec: bool = True,
+    jobs: int = 2,
+    audio_codec: str = "aac",
+    preset: str = None,
+    tune: str = None,
+    segments: List[Dict[str, float]] = None,
 ) -> str:
     """
     使用 FFmpeg select/aselect 滤镜剪辑视频
@@ -98,6 +245,12 @@ def cut_video(
         bitrate: 视频比特率（CBR 模式使用）
         vbr: 是否使用 VBR 可变码率模式
         cq: VBR 模式的质量参数 (0-51)，值越小质量越高
+        hwdec: 是否使用 NVDEC (CUDA) 硬件解码（失败时自动改用 CPU 解码）
+        jobs: 并行编码的 ffmpeg 进程数（消费级显卡 NVENC 会话数有限，默认 2）
+        audio_codec: 输出音频编码，aac (192k) 或 flac
+        preset: NVENC 编码预设 p1-p7（默认 CBR 为 p2，VBR 为 p4）
+        tune: NVENC tune，hq/ll/ull（默认 CBR 为 ll）
+        segments: 已计算好的剪辑片段（可选，默认从 srt_file 解析）
 
     Returns:
         输出视频文件路径
@@ -106,7 +259,8 @@ def cut_video(
         base, _ = os.path.splitext(input_video)
         output_video = f"{base}_c.mp4"
 
-    segments = parse_srt_segments(srt_file, encoding)
+    if segments is None:
+        segments = parse_srt_segments(srt_file, encoding)
 
     if not segments:
         logging.warning("没有找到有效的字幕片段")
@@ -117,77 +271,78 @@ def cut_video(
     logging.info(f"找到 {len(segments)} 个片段，预计输出时长: {total_duration:.1f}s")
 
     # 获取原始视频帧率
-    probe_cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=r_frame_rate",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        input_video
-    ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-    fps = probe_result.stdout.strip()  # 格式如 "60/1" 或 "30000/1001"
+    fps = _probe_fps(input_video, os.path.getmtime(input_video))
     logging.info(f"原始视频帧率: {fps}")
 
-    # 构建 select 表达式
-    select_expr = "+".join(
-        f"between(t,{seg['start']},{seg['end']})" for seg in segments
-    )
+    # NVENC 预设、tune 和码率控制参数
+    video_args = nvenc_args(preset, tune, vbr, cq, bitrate)
 
-    # 构建 filter_complex
-    # fps: 将 VFR 转为 CFR，确保 select 按时间戳正确选择帧（使用原始帧率）
-    # aresample=44100: 在 loudnorm 后重采样，避免输出 96kHz
-    filter_complex = (
-        f"[0:v]fps={fps},select='{select_expr}',setpts=N/FRAME_RATE/TB,format=yuv420p[outv];"
-        f"[0:a]aselect='{select_expr}',asetpts=N/SR/TB,loudnorm=I=-16:TP=-1.5:LRA=11,aresample=44100[outa]"
-    )
+    # 输出音频编码：AAC 只在最终输出时编码一次，兼容性好；flac 无损但单线程编码较慢
+    if audio_codec == "aac":
+        audio_args = ["-c:a", "aac", "-b:a", "192k", "-movflags", "+faststart"]
+    else:
+        audio_args = ["-c:a", audio_codec, "-movflags", "+faststart"]
 
     # 使用临时文件存储 filter_complex，避免命令行过长
     temp_dir = tempfile.mkdtemp()
-    filter_script = os.path.join(temp_dir, "filter.txt")
 
     try:
-        with open(filter_script, "w", encoding="utf-8") as f:
-            f.write(filter_complex)
+        # 先测量全部选中音频的响度，再以线性模式应用 loudnorm
+        # 线性模式只是固定增益，各组分别应用同一组测量值，结果与整体处理一致
+        audio_graph = f"[0:a]aselect='{build_select_expr(segments)}',asetpts=N/SR/TB"
+        measured = measure_loudness(input_video, audio_graph, os.path.join(temp_dir, "loudness.txt"))
+        loudnorm = loudnorm_filter(measured)
+
+        buckets = split_segments(segments, jobs)
+
+        # loudnorm 退回动态模式时，每组从初始状态开始自适应，分组处会出现响度跳变，改为单进程处理
+        if len(buckets) > 1 and not loudnorm_is_linear(measured):
+            logging.warning("loudnorm 无法保持线性模式，改为单个 ffmpeg 进程处理以保证响度连续")
+            buckets = [segments]
+
+        if len(buckets) == 1:
+            logging.info("开始处理视频...")
+            _encode(
+                input_video, segments, output_video, os.path.join(temp_dir, "filter.txt"),
+                fps, loudnorm, video_args, audio_args, hwdec,
+            )
+            logging.info(f"视频已保存到: {output_video}")
+            return output_video
+
+        # 分组并行编码：每个 ffmpeg 进程 -ss 定位后只处理一组片段
+        # 中间文件使用 mov + pcm_s16le 音频：无损且几乎不耗 CPU，concat demuxer 兼容性好
+        logging.info(f"开始处理视频，{len(buckets)} 个 ffmpeg 进程并行编码...")
+        parts = [os.path.join(temp_dir, f"part{i}.mov") for i in range(len(buckets))]
+        with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+            futures = [
+                executor.submit(
+                    _encode,
+                    input_video, bucket, part, os.path.join(temp_dir, f"filter{i}.txt"),
+                    fps, loudnorm, video_args, ["-c:a", "pcm_s16le"], hwdec, True,
+                )
+                for i, (bucket, part) in enumerate(zip(buckets, parts))
+            ]
+            for future in futures:
+                future.result()
+
+        # concat demuxer 拼接，视频直接复制，只在这里对音频编码一次
+        concat_list = os.path.join(temp_dir, "concat.txt")
+        with open(concat_list, "w", encoding="utf-8") as f:
+            for part in parts:
+                path = part.replace("\\", "/").replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
 
-        # 构建 FFmpeg 命令
         cmd = [
-            "ffmpeg", "-y",
-            "-i", input_video,
-            "-filter_complex_script", filter_script,
-            "-map", "[outv]",
-            "-map", "[outa]",
-            "-c:v", "h264_nvenc",
-            "-r", "30", # 输出固定30fps减小文件大小
-            "-preset", "p4",
+            "ffmpeg", "-y", "-nostats",
+            "-f", "concat", "-safe", "0",
+            "-i", concat_list,
+            "-c:v", "copy",
         ]
+        cmd.extend(audio_args)
+        cmd.append(output_video)
 
-        # 码率控制模式
-        if vbr:
-            # VBR 可变码率：文件更小，质量稳定
-            cmd.extend(["-rc", "vbr", "-cq", str(cq)])
-            logging.info(f"使用 VBR 模式 (cq={cq})")
-        else:
-            # CBR 恒定码率：兼容性更好
-            cmd.extend(["-b:v", bitrate])
-            logging.info(f"使用 CBR 模式 (bitrate={bitrate})")
-
-        #  faststart 优化，流媒体友好
-        cmd.extend(["-max_muxing_queue_size", "1024"])
-
-        # 音频编码（采样率已在滤镜中处理）
-        # 使用flac无损编码替代AAC，避免多次编码损失
-        cmd.extend([
-            "-c:a", "flac",
-            "-movflags", "+faststart",
-            output_video
-        ])
-
-        logging.info("开始处理视频...")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logging.error(f"FFmpeg 错误: {result.stderr}")
-            raise RuntimeError(f"FFmpeg 处理失败: {result.stderr}")
+        logging.info("拼接视频...")
+        run_ffmpeg(cmd, "FFmpeg 拼接失败")
 
         logging.info(f"视频已保存到: {output_video}")
         return output_video
@@ -213,6 +368,12 @@ def main():
     parser.add_argument("--bitrate", default="10M", help="CBR 模式的视频比特率")
     parser.add_argument("--vbr", action="store_true", help="使用 VBR 可变码率模式（文件更小）")
     parser.add_argument("--cq", type=int, default=23, help="VBR 模式的质量参数 (0-51)，值越小质量越高，默认 23")
+    add_nvenc_arguments(parser)
+    parser.add_argument("--no-hwdec", action="store_true", help="不使用 NVDEC 硬件解码（改用 CPU 解码）")
+    parser.add_argument("--pad", type=float, default=0.0, help="剪辑前为字幕每行头尾加 padding 秒数（同 srt_padding），默认 0")
+    parser.add_argument("--sync-srt", action="store_true", help="同时输出与剪辑后视频同步的字幕（同 srt_cut_sync，与输出视频同名 .srt）")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="并行编码的 ffmpeg 进程数，默认 2（1 表示不分组）")
+    parser.add_argument("--audio-codec", default="aac", choices=["aac", "flac"], help="输出音频编码，默认 aac (192k)")
 
     args = parser.parse_args()
 
@@ -222,7 +383,10 @@ def main():
         base, _ = os.path.splitext(args.video)
         srt_file = f"{base}.srt"
 
-    cut_video(
+    # 只解析一次 SRT，同时得到剪辑片段和同步后的字幕
+    segments, synced = plan(srt_file, args.pad, encoding=args.encoding)
+
+    output = cut_video(
         args.video,
         srt_file,
         args.output,
@@ -230,8 +394,20 @@ def main():
         args.bitrate,
         args.vbr,
         args.cq,
+        not args.no_hwdec,
+        args.jobs,
+        args.audio_codec,
+        preset=args.preset,
+        tune=args.tune,
+        segments=segments,
     )
 
+    if output and args.sync_srt:
+        srt_output = os.path.splitext(output)[0] + ".srt"
+        with open(srt_output, "w", encoding=args.encoding) as f:
+            f.write(compose(synced))
+        logging.info(f"同步后的字幕已保存到: {srt_output}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -11,9 +11,12 @@ FFmpeg 视频剪辑工具 - 使用 trim + concat 方案
 实现方案：
     - 使用 FFmpeg 的 trim/atrim 滤镜裁剪每个片段，再 concat 拼接
     - 音视频绑定处理，避免 VFR 视频导致的时长不一致问题
-    - CPU：解码 + 滤镜处理
+    - 先用 ebur128 测量拼接后音频的响度，再以 linear=true 模式应用 loudnorm
+    - GPU (NVDEC)：解码，帧留在显存中，trim 裁剪后才 hwdownload 回内存
+    - CPU：concat 等滤镜处理
     - GPU (nvenc)：编码
     - 使用 filter_complex_script 避免命令行过长
+    - NVENC 预设可选 p1-p7，默认 CBR 使用 p2 + tune ll，VBR 使用 p4（见 _ffmpeg.nvenc_args）
     - 支持 VBR (可变码率) 和 CBR (恒定码率) 两种模式
 
 与 ffmpeg_cut_select_select.py (select 方案) 的区别：
@@ -25,43 +28,111 @@ FFmpeg 视频剪辑工具 - 使用 trim + concat 方案
     python -m videoauto.ffmpeg_cut_trim video.mp4 video.srt
     python -m videoauto.ffmpeg_cut_trim video.mp4 -o output.mp4
     python -m videoauto.ffmpeg_cut_trim video.mp4 --vbr --cq 23
+    python -m videoauto.ffmpeg_cut_trim video.mp4 --pad 0.1 --sync-srt
 """
 
 import logging
 import os
 import shutil
-import subprocess
 import tempfile
 from typing import Dict, List
 
-import srt
+from videoauto._ffmpeg import add_nvenc_arguments, loudnorm_filter, measure_loudness, nvenc_args, run_ffmpeg
+from videoauto._srt_fast import compose
+from videoauto.srt_pipeline import load, merge_segments, plan, sort_by_start
 
 
 def parse_srt_segments(srt_file: str, encoding: str = "utf-8") -> List[Dict[str, float]]:
     """解析 SRT 文件，提取时间片段并合并相邻片段"""
-    with open(srt_file, encoding=encoding) as f:
-        subs = list(srt.parse(f.read()))
-
-    segments = []
-    subs.sort(key=lambda x: x.start)
-
-    for x in subs:
-        if len(segments) == 0:
-            segments.append({
-                "start": x.start.total_seconds(),
-                "end": x.end.total_seconds()
-            })
-        else:
-            # 合并间隔小于 0.5 秒的片段
-            if x.start.total_seconds() - segments[-1]["end"] < 0.5:
-                segments[-1]["end"] = x.end.total_seconds()
-            else:
-                segments.append({
-                    "start": x.start.total_seconds(),
-                    "end": x.end.total_seconds()
-                })
-
-    return segments
+    start_ms, end_ms, _ = sort_by_start(*load(srt_file, encoding))
+    return merge_segments(start_ms, end_ms)
+
+
+def build_audio_graph(segments: List[Dict[str, float]]) -> str:
+    """构建音频部分的 filter_complex：atrim 裁剪每个片段后 concat 拼接（最后一个滤镜不带输出标签）"""
+    n = len(segments)
+    audio_parts = [
+        # atrim: 裁剪音频，asetpts: 重置时间戳从 0 开始
+        f"[0:a]atrim=start={seg['start']}:end={seg['end']},asetpts=PTS-STARTPTS[a{i}]"
+        for i, seg in enumerate(segments)
+    ]
+    audio_inputs = "".join(f"[a{i}]" for i in range(n))
+    audio_parts.append(f"{audio_inputs}concat=n={n}:v=0:a=1,aresample=44100")
+    return ";".join(audio_parts)
+
+
+def build_video_graph(segments: List[Dict[str, float]], hwdec: bool = True) -> str:
+    """构建视频部分的 filter_complex：trim 裁剪每个片段后 concat 拼接，输出 [outv]"""
+    n = len(segments)
+    # 硬件解码时 trim/setpts 只处理时间戳，直接作用于显存中的帧，
+    # 裁剪后再 hwdownload，只有保留的帧才会拷贝回内存；nvenc 直接接受 nv12
+    download = ",hwdownload,format=nv12" if hwdec else ""
+    video_format = "nv12" if hwdec else "yuv420p"
+    video_parts = [
+        # trim: 裁剪视频，setpts: 重置时间戳从 0 开始
+        f"[0:v]trim=start={seg['start']}:end={seg['end']},setpts=PTS-STARTPTS{download}[v{i}]"
+        for i, seg in enumerate(segments)
+    ]
+    video_inputs = "".join(f"[v{i}]" for i in range(n))
+    video_parts.append(f"{video_inputs}concat=n={n}:v=1:a=0,format={video_format}[outv]")
+    return ";".join(video_parts)
+
+
+def _encode(
+    input_video: str,
+    segments: List[Dict[str, float]],
+    output_video: str,
+    filter_script: str,
+    loudnorm: str,
+    video_args: List[str],
+    hwdec: bool = True,
+) -> None:
+    """
+    使用 trim/atrim + concat 滤镜编码所有片段
+
+    硬件解码失败时自动改用 CPU 解码重试一次。
+    """
+    # 关键：每个片段的视频和音频使用相同的 start/end，确保时长一致
+    filter_complex = (
+        f"{build_video_graph(segments, hwdec)};"
+        f"{build_audio_graph(segments)},{loudnorm}[outa]"
+    )
+
+    with open(filter_script, "w", encoding="utf-8") as f:
+        f.write(filter_complex)
+
+    # 构建 FFmpeg 命令
+    cmd = ["ffmpeg", "-y", "-nostats"]
+
+    # NVDEC 硬件解码，解码后的帧直接留在显存 (AV_PIX_FMT_CUDA)
+    if hwdec:
+        cmd.extend(["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"])
+
+    cmd.extend([
+        "-i", input_video,
+        "-filter_complex_script", filter_script,
+        "-map", "[outv]",
+        "-map", "[outa]",
+        "-c:v", "h264_nvenc",
+    ])
+    cmd.extend(video_args)
+    cmd.extend(["-max_muxing_queue_size", "1024"])
+
+    # 音频编码（采样率已在滤镜中处理）
+    cmd.extend([
+        "-c:a", "aac",
+        "-movflags", "+faststart",
+        output_video
+    ])
+
+    try:
+        run_ffmpeg(cmd)
+    except RuntimeError:
+        if not hwdec:
+            raise
+        # NVDEC 不支持的格式（如 H.264 High10/4:2:2）会退回软件解码，hwdownload 无法配置
+        logging.warning("NVDEC 硬件解码失败（可能不支持该视频的编码格式），改用 CPU 解码重试")
+        _encode(input_video, segments, output_video, filter_script, loudnorm, video_args, False)
 
 
 def cut_video(
@@ -72,6 +143,10 @@ def cut_video(
     bitrate: str = "10M",
     vbr: bool = False,
     cq: int = 23,
+    hwdec: bool = True,
+    preset: str = None,
+    tune: str = None,
+    segments: List[Dict[str, float]] = None,
 ) -> str:
     """
     使用 FFmpeg trim/atrim + concat 滤镜剪辑视频
@@ -84,6 +159,10 @@ def cut_video(
         bitrate: 视频比特率（CBR 模式使用）
         vbr: 是否使用 VBR 可变码率模式
         cq: VBR 模式的质量参数 (0-51)，值越小质量越高
+        hwdec: 是否使用 NVDEC (CUDA) 硬件解码（失败时自动改用 CPU 解码）
+        preset: NVENC 编码预设 p1-p7（默认 CBR 为 p2，VBR 为 p4）
+        tune: NVENC tune，hq/ll/ull（默认 CBR 为 ll）
+        segments: 已计算好的剪辑片段（可选，默认从 srt_file 解析）
 
     Returns:
         输出视频文件路径
@@ -92,7 +171,8 @@ def cut_video(
         base, _ = os.path.splitext(input_video)
         output_video = f"{base}_c.mp4"
 
-    segments = parse_srt_segments(srt_file, encoding)
+    if segments is None:
+        segments = parse_srt_segments(srt_file, encoding)
 
     if not segments:
         logging.warning("没有找到有效的字幕片段")
@@ -102,78 +182,22 @@ def cut_video(
     total_duration = sum(seg["end"] - seg["start"] for seg in segments)
     logging.info(f"找到 {len(segments)} 个片段，预计输出时长: {total_duration:.1f}s")
 
-    # 构建 filter_complex
-    # 使用 trim/atrim 分别裁剪每个片段，然后 concat 拼接
-    # 关键：每个片段的视频和音频使用相同的 start/end，确保时长一致
-    n = len(segments)
-    filter_parts = []
-
-    for i, seg in enumerate(segments):
-        start = seg["start"]
-        end = seg["end"]
-        # trim: 裁剪视频，setpts: 重置时间戳从 0 开始
-        # atrim: 裁剪音频，asetpts: 重置时间戳从 0 开始
-        filter_parts.append(
-            f"[0:v]trim=start={start}:end={end},setpts=PTS-STARTPTS[v{i}]"
-        )
-        filter_parts.append(
-            f"[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{i}]"
-        )
-
-    # concat 拼接所有片段
-    video_inputs = "".join(f"[v{i}]" for i in range(n))
-    audio_inputs = "".join(f"[a{i}]" for i in range(n))
-    filter_parts.append(
-        f"{video_inputs}concat=n={n}:v=1:a=0,format=yuv420p[outv]"
-    )
-    filter_parts.append(
-        f"{audio_inputs}concat=n={n}:v=0:a=1,aresample=44100,loudnorm=I=-16:TP=-1.5:LRA=11[outa]"
-    )
-
-    filter_complex = ";".join(filter_parts)
+    # NVENC 预设、tune 和码率控制参数
+    video_args = nvenc_args(preset, tune, vbr, cq, bitrate)
 
     # 使用临时文件存储 filter_complex，避免命令行过长
     temp_dir = tempfile.mkdtemp()
-    filter_script = os.path.join(temp_dir, "filter.txt")
 
     try:
-        with open(filter_script, "w", encoding="utf-8") as f:
-            f.write(filter_complex)
-
-        # 构建 FFmpeg 命令
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", input_video,
-            "-filter_complex_script", filter_script,
-            "-map", "[outv]",
-            "-map", "[outa]",
-            "-c:v", "h264_nvenc",
-            "-preset", "p4",
-        ]
-
-        # 码率控制模式
-        if vbr:
-            cmd.extend(["-rc", "vbr", "-cq", str(cq)])
-            logging.info(f"使用 VBR 模式 (cq={cq})")
-        else:
-            cmd.extend(["-b:v", bitrate])
-            logging.info(f"使用 CBR 模式 (bitrate={bitrate})")
-
-        cmd.extend(["-max_muxing_queue_size", "1024"])
-
-        # 音频编码（采样率已在滤镜中处理）
-        cmd.extend([
-            "-c:a", "aac",
-            "-movflags", "+faststart",
-            output_video
-        ])
+        # 先测量拼接后音频的响度，再以线性模式应用 loudnorm
+        measured = measure_loudness(input_video, build_audio_graph(segments), os.path.join(temp_dir, "loudness.txt"))
+        loudnorm = loudnorm_filter(measured)
 
         logging.info("开始处理视频...")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logging.error(f"FFmpeg 错误: {result.stderr}")
-            raise RuntimeError(f"FFmpeg 处理失败: {result.stderr}")
+        _encode(
+            input_video, segments, output_video, os.path.join(temp_dir, "filter.txt"),
+            loudnorm, video_args, hwdec,
+        )
 
         logging.info(f"视频已保存到: {output_video}")
         return output_video
@@ -199,6 +223,10 @@ def main():
     parser.add_argument("--bitrate", default="10M", help="CBR 模式的视频比特率")
     parser.add_argument("--vbr", action="store_true", help="使用 VBR 可变码率模式（文件更小）")
     parser.add_argument("--cq", type=int, default=23, help="VBR 模式的质量参数 (0-51)，值越小质量越高，默认 23")
+    add_nvenc_arguments(parser)
+    parser.add_argument("--no-hwdec", action="store_true", help="不使用 NVDEC 硬件解码（改用 CPU 解码）")
+    parser.add_argument("--pad", type=float, default=0.0, help="剪辑前为字幕每行头尾加 padding 秒数（同 srt_padding），默认 0")
+    parser.add_argument("--sync-srt", action="store_true", help="同时输出与剪辑后视频同步的字幕（同 srt_cut_sync，与输出视频同名 .srt）")
 
     args = parser.parse_args()
 
@@ -208,7 +236,10 @@ def main():
         base, _ = os.path.splitext(args.video)
         srt_file = f"{base}.srt"
 
-    cut_video(
+    # 只解析一次 SRT，同时得到剪辑片段和同步后的字幕
+    segments, synced = plan(srt_file, args.pad, encoding=args.encoding)
+
+    output = cut_video(
         args.video,
         srt_file,
         args.output,
@@ -216,8 +247,18 @@ def main():
         args.bitrate,
         args.vbr,
         args.cq,
+        not args.no_hwdec,
+        preset=args.preset,
+        tune=args.tune,
+        segments=segments,
     )
 
+    if output and args.sync_srt:
+        srt_output = os.path.splitext(output)[0] + ".srt"
+        with open(srt_output, "w", encoding=args.encoding) as f:
+            f.write(compose(synced))
+        logging.info(f"同步后的字幕已保存到: {srt_output}")
+
 
 if __name__ == "__main__":
     main()
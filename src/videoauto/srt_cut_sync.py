@@ -14,15 +14,17 @@ SRT 字幕时间同步工具
     python -m videoauto.srt_cut_sync input.srt
     python -m videoauto.srt_cut_sync input.srt -o output.srt
     python -m videoauto.srt_cut_sync input.srt --gap 0.3
+
+    剪辑视频时也可以直接用 --sync-srt 同时输出同步后的字幕，只解析一次 SRT：
+    python -m videoauto.ffmpeg_cut_select video.mp4 --sync-srt
 """
 
 import argparse
 import logging
 import os
-from datetime import timedelta
-from typing import List
 
-import srt
+from videoauto._srt_fast import compose, format_timestamp
+from videoauto.srt_pipeline import load, sort_by_start, sync_times
 
 
 def sync_srt(
@@ -52,63 +54,37 @@ def sync_srt(
         base, ext = os.path.splitext(input_file)
         output_file = f"{base}_c{ext}"
 
-    # 读取并解析 SRT
-    with open(input_file, encoding=encoding) as f:
-        subs = list(srt.parse(f.read()))
+    # 读取并解析 SRT（毫秒整数）
+    start_ms, end_ms, contents = load(input_file, encoding)
 
-    if not subs:
+    if len(start_ms) == 0:
         logging.warning("没有找到有效的字幕")
         return None
 
-    logging.info(f"原始字幕数量: {len(subs)}")
+    logging.info(f"原始字幕数量: {len(start_ms)}")
 
     # 按开始时间排序
-    subs.sort(key=lambda x: x.start)
+    start_ms, end_ms, contents = sort_by_start(start_ms, end_ms, contents)
 
     # 记录原始结束时间
-    original_end = max(sub.end for sub in subs)
-    logging.info(f"原始结束时间: {original_end}")
-
-    # 调整时间戳
-    synced: List[srt.Subtitle] = []
-    
-    # 第一条字幕的开始时间作为初始偏移量，使其前移至 0
-    first_start = subs[0].start
-    total_shift = first_start
-    logging.debug(f"第一条字幕开始时间: {first_start}, 初始前移: {total_shift.total_seconds():.2f}s")
-
-    for i, sub in enumerate(subs):
-        if i > 0:
-            prev = subs[i - 1]
-            gap = (sub.start - prev.end).total_seconds()
-
-            # 间隔 >= max_gap 时，前移整个间隔（与视频剪切逻辑一致）
-            if gap >= max_gap:
-                total_shift += timedelta(seconds=gap)
-                logging.debug(f"字幕 {i + 1}: 间隔 {gap:.2f}s >= {max_gap}s, 累计前移 {total_shift.total_seconds():.2f}s")
-
-        # 应用累计前移
-        new_start = sub.start - total_shift
-        new_end = sub.end - total_shift
-
-        synced.append(srt.Subtitle(
-            index=i + 1,
-            start=new_start,
-            end=new_end,
-            content=sub.content.strip()
-        ))
+    original_end = int(end_ms.max())
+    logging.info(f"原始结束时间: {format_timestamp(original_end)}")
+
+    # 调整时间戳（逻辑见 srt_pipeline.sync_times）
+    new_start, new_end = sync_times(start_ms, end_ms, max_gap)
+    synced = list(zip(new_start.tolist(), new_end.tolist(), (c.strip() for c in contents)))
 
     # 计算压缩后总时长
-    new_end = max(sub.end for sub in synced)
-    saved = (original_end - new_end).total_seconds()
+    synced_end = int(new_end.max())
+    saved = (original_end - synced_end) / 1000
 
     logging.info(f"同步后字幕数量: {len(synced)}")
-    logging.info(f"新结束时间: {new_end}")
+    logging.info(f"新结束时间: {format_timestamp(synced_end)}")
     logging.info(f"总共压缩: {saved:.1f}s")
 
     # 写入文件
     with open(output_file, "w", encoding=encoding) as f:
-        f.write(srt.compose(synced))
+        f.write(compose(synced))
 
     logging.info(f"已保存到: {output_file}")
     return output_file
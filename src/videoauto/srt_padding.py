@@ -8,31 +8,17 @@
 """
 
 import argparse
-import srt
-from datetime import timedelta
 import shutil
 import os
 
+from videoauto._srt_fast import compose
+from videoauto.srt_pipeline import load, pad_times
+
 def pad_srt(input_file, output_file, pad=0.1, encoding="utf-8"):
-    with open(input_file, encoding=encoding) as f:
-        subs = list(srt.parse(f.read()))
-    n = len(subs)
-    for i, sub in enumerate(subs):
-        # 头部 padding，不能小于 0，也不能超过上一条的 end
-        new_start = max(
-            timedelta(seconds=0),
-            sub.start - timedelta(seconds=pad),
-            subs[i-1].end if i > 0 else timedelta(seconds=0)
-        )
-        # 尾部 padding，不能超过下一条的 start
-        new_end = min(
-            sub.end + timedelta(seconds=pad),
-            subs[i+1].start if i < n-1 else sub.end + timedelta(hours=1)
-        )
-        sub.start = new_start
-        sub.end = new_end
+    start_ms, end_ms, contents = load(input_file, encoding)
+    new_start, new_end = pad_times(start_ms, end_ms, pad)
     with open(output_file, "w", encoding=encoding) as f:
-        f.write(srt.compose(subs))
+        f.write(compose(zip(new_start.tolist(), new_end.tolist(), contents)))
 
 def main():
     parser = argparse.ArgumentParser(description="为 SRT 字幕每行时间戳头尾加 padding")
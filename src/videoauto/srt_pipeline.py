@@ -0,0 +1,130 @@
+"""
+SRT 处理流水线：一次解析完成 padding、剪辑片段计算和字幕同步
+
+典型流程中同一份 SRT 会被 srt_padding 解析并重写、ffmpeg_cut_* 再解析一遍、
+srt_cut_sync 再解析一遍。plan() 只读取、解析一次，padding / 片段合并 / 时间同步
+都在毫秒整数数组上向量化完成，同时得到剪辑片段和同步后的字幕。
+
+各步骤的逻辑与对应模块一致：
+    - pad_times: srt_padding.pad_srt，每行头尾 padding，不超过相邻字幕
+    - merge_segments: ffmpeg_cut_*.parse_srt_segments，合并间隔 < max_gap 的字幕
+    - sync_times: srt_cut_sync.sync_srt，去掉被剪掉的间隔，第一条字幕前移至 0
+
+使用方法：
+    python -m videoauto.ffmpeg_cut_select video.mp4 --pad 0.1 --sync-srt
+    python -m videoauto.ffmpeg_cut_trim video.mp4 --pad 0.1 --sync-srt
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from videoauto._srt_fast import parse_arrays
+
+
+def load(srt_file: str, encoding: str = "utf-8") -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """读取并解析 SRT 文件，返回 (start_ms, end_ms, contents)，按文件顺序"""
+    with open(srt_file, encoding=encoding) as f:
+        return parse_arrays(f.read())
+
+
+def sort_by_start(
+    start_ms: np.ndarray, end_ms: np.ndarray, contents: List[str]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """按开始时间排序（稳定排序，与 list.sort 一致）"""
+    order = np.argsort(start_ms, kind="stable")
+    return start_ms[order], end_ms[order], [contents[i] for i in order.tolist()]
+
+
+def pad_times(start_ms: np.ndarray, end_ms: np.ndarray, pad: float) -> Tuple[np.ndarray, np.ndarray]:
+    """每行头尾加 pad 秒，相邻字幕按文件顺序处理"""
+    pad_ms = round(pad * 1000)
+    # 尾部 padding，不能超过下一条的 start
+    new_end = end_ms + pad_ms
+    new_end[:-1] = np.minimum(new_end[:-1], start_ms[1:])
+    # 头部 padding，不能小于 0，也不能超过上一条（padding 后）的 end
+    new_start = np.maximum(start_ms - pad_ms, 0)
+    new_start[1:] = np.maximum(new_start[1:], new_end[:-1])
+    return new_start, new_end
+
+
+def merge_segments(start_ms: np.ndarray, end_ms: np.ndarray, max_gap: float = 0.5) -> List[Dict[str, float]]:
+    """合并间隔小于 max_gap 秒的字幕，得到剪辑片段（输入需已按开始时间排序）"""
+    if len(start_ms) == 0:
+        return []
+
+    starts = start_ms / 1000
+    ends = end_ms / 1000
+
+    # 与上一条字幕间隔 >= max_gap 时开始新片段，否则合并到当前片段
+    new_segment = np.empty(len(starts), dtype=bool)
+    new_segment[0] = True
+    new_segment[1:] = starts[1:] - ends[:-1] >= max_gap
+
+    # 片段开始于组内第一条字幕，结束于组内最后一条字幕
+    first = np.flatnonzero(new_segment)
+    last = np.append(first[1:] - 1, len(starts) - 1)
+
+    return [
+        {"start": start, "end": end}
+        for start, end in zip(starts[first].tolist(), ends[last].tolist())
+    ]
+
+
+def sync_times(start_ms: np.ndarray, end_ms: np.ndarray, max_gap: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """去掉被剪掉的间隔，返回剪辑后视频中的字幕时间（输入需已按开始时间排序）"""
+    if len(start_ms) == 0:
+        return start_ms, end_ms
+
+    # 第一条字幕的开始时间作为初始偏移量，使其前移至 0
+    # 间隔 >= max_gap 时，前移整个间隔（与视频剪切逻辑一致），累加得到每条字幕的前移量
+    gaps = start_ms[1:] - end_ms[:-1]
+    cut = gaps / 1000 >= max_gap
+    total_shift = np.empty_like(start_ms)
+    total_shift[0] = start_ms[0]
+    total_shift[1:] = start_ms[0] + np.cumsum(np.where(cut, gaps, 0))
+    logging.debug(f"第一条字幕初始前移: {start_ms[0] / 1000:.2f}s")
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for i in np.flatnonzero(cut).tolist():
+            logging.debug(f"字幕 {i + 2}: 间隔 {gaps[i] / 1000:.2f}s >= {max_gap}s, 累计前移 {total_shift[i + 1] / 1000:.2f}s")
+
+    return start_ms - total_shift, end_ms - total_shift
+
+
+def plan(
+    srt_file: str,
+    pad: float = 0.0,
+    max_gap: float = 0.5,
+    encoding: str = "utf-8",
+) -> Tuple[List[Dict[str, float]], List[Tuple[int, int, str]]]:
+    """
+    一次解析 SRT，同时得到剪辑片段和同步后的字幕
+
+    Args:
+        srt_file: SRT 字幕文件路径
+        pad: 每行头尾 padding 秒数，0 表示不 padding
+        max_gap: 片段合并阈值（秒）
+        encoding: 字幕文件编码
+
+    Returns:
+        (segments, synced)：
+        segments 为剪辑片段 [{"start", "end"}, ...]（秒），
+        synced 为剪辑后视频对应的字幕 [(start_ms, end_ms, content), ...]
+    """
+    start_ms, end_ms, contents = load(srt_file, encoding)
+
+    if pad:
+        start_ms, end_ms = pad_times(start_ms, end_ms, pad)
+        # 与 srt_padding 写出文件时一致（compose 会丢弃这些字幕）：
+        # 未按时间排序的 SRT 经 padding 后可能出现开始不早于结束的字幕，连同空字幕一起去掉
+        keep = (start_ms < end_ms) & np.array([bool(c.strip()) for c in contents], dtype=bool)
+        start_ms, end_ms = start_ms[keep], end_ms[keep]
+        contents = [c for c, k in zip(contents, keep.tolist()) if k]
+
+    start_ms, end_ms, contents = sort_by_start(start_ms, end_ms, contents)
+    segments = merge_segments(start_ms, end_ms, max_gap)
+    new_start, new_end = sync_times(start_ms, end_ms, max_gap)
+    synced = list(zip(new_start.tolist(), new_end.tolist(), (c.strip() for c in contents)))
+    return segments, synced
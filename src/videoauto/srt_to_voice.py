@@ -1,62 +1,125 @@
 """
 使用 edge-tts 为 SRT 字幕生成配音。
-- 每行字幕用 edge-tts 合成，若合成音频比字幕时长长则自动加速，否则补静音。
+- 每行字幕用 edge-tts 合成（多个请求并发进行），若合成音频比字幕时长长则自动加速，否则补静音。
 - 行间空隙自动补静音。
 - 输出音频总时长与 SRT 完全一致。
 - 支持自定义 edge-tts 语音。
+- 变速 (atempo)、补静音 (apad) 和拼接 (concat) 在一次 ffmpeg 调用中完成，
+  不再为每条需要加速的字幕单独启动 ffmpeg。
 
 示例用法：
-    python srt_to_voice.py input.srt -o output.wav --voice zh-CN-XiaoxiaoNeural
+    python -m videoauto.srt_to_voice input.srt -o output.wav --voice zh-CN-XiaoxiaoNeural
 """
 
 import asyncio
 import edge_tts
-import srt
-from pydub import AudioSegment, silence
-from datetime import timedelta
+import numpy as np
+from pydub import AudioSegment
 import argparse
 import os
 import io
-import subprocess
+import shutil
 import tempfile
 
-def ffmpeg_speedup(audio: AudioSegment, speed: float) -> AudioSegment:
+from videoauto._ffmpeg import escape_filter_path, run_ffmpeg
+from videoauto._srt_fast import parse
+
+# 单次 ffmpeg 调用最多打开的音频片段数，避免超出系统文件句柄限制
+MAX_CLIPS_PER_PASS = 256
+
+def atempo_filter(speed: float) -> str:
     """
     pydub.speedup 变速变调，容易破音
     ffmpeg atempo 变速不变调，音质好
     """
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f_in, \
-         tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f_out:
-        audio.export(f_in.name, format="wav")
-        # atempo 支持 0.5~2.0，超出需多次串联
-        atempo_filters = []
-        remain = speed
-        while remain > 2.0:
-            atempo_filters.append("atempo=2.0")
-            remain /= 2.0
-        while remain < 0.5:
-            atempo_filters.append("atempo=0.5")
-            remain /= 0.5
-        atempo_filters.append(f"atempo={remain:.5f}")
-        filter_str = ",".join(atempo_filters)
-        cmd = [
-            "ffmpeg", "-y", "-i", f_in.name,
-            "-filter:a", filter_str,
-            f_out.name
-        ]
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        sped = AudioSegment.from_file(f_out.name, format="wav")
-
-    os.unlink(f_in.name)
-    os.unlink(f_out.name)
-    return sped
+    # atempo 支持 0.5~2.0，超出需多次串联
+    atempo_filters = []
+    remain = speed
+    while remain > 2.0:
+        atempo_filters.append("atempo=2.0")
+        remain /= 2.0
+    while remain < 0.5:
+        atempo_filters.append("atempo=0.5")
+        remain /= 0.5
+    atempo_filters.append(f"atempo={remain:.5f}")
+    return ",".join(atempo_filters)
+
+def silence_source(duration_ms: int, frame_rate: int) -> str:
+    """生成指定时长静音的滤镜源"""
+    return f"anullsrc=r={frame_rate}:cl=mono,atrim=duration={duration_ms / 1000}"
+
+def concat_sources(sources, output, temp_dir, name):
+    """用一次 ffmpeg 调用把多个滤镜源按顺序拼接输出"""
+    graph = [f"{src}[a{i}]" for i, src in enumerate(sources)]
+    graph.append("".join(f"[a{i}]" for i in range(len(sources))) + f"concat=n={len(sources)}:v=0:a=1[out]")
+    filter_script = os.path.join(temp_dir, f"{name}.txt")
+    with open(filter_script, "w", encoding="utf-8") as f:
+        f.write(";".join(graph))
+    # 不指定 cwd（否则无法走 posix_spawn），amovie 使用转义后的绝对路径
+    run_ffmpeg(
+        ["ffmpeg", "-y", "-nostats", "-filter_complex_script", filter_script, "-map", "[out]", output],
+        "FFmpeg 合成配音失败",
+    )
+
+# pydub sample_width -> numpy 采样类型（pydub 内部已将 24bit 转为 32bit）
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# 计算分块能量时每批处理的块数，限制临时数组的大小
+ENERGY_BATCH_CHUNKS = 256
+
+def _chunk_energies(audio: AudioSegment, chunk_size, from_end=False):
+    # 与 pydub.silence 相同：按 chunk_size 毫秒分块，返回每块的均方能量
+    # 每次只对一批块计算平方和，不转换整段音频、不创建同样大小的临时数组
+    # from_end=True 时在反向视图上分块（[::-1] 不复制数据），与对 audio.reverse() 分块的结果一致
+    samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width])
+    if from_end:
+        samples = samples[::-1]
+
+    # 块边界与 AudioSegment 按毫秒切片一致：毫秒 -> 帧后取整（22050Hz 时 10ms 为 220.5 帧），
+    # 超出实际长度的部分视为静音，计入均值的分母
+    duration = len(audio)
+    starts_ms = np.arange(0, duration, chunk_size)
+    ms = np.append(starts_ms, np.minimum(starts_ms[-1:] + chunk_size, duration))
+    bounds = (ms * (audio.frame_rate / 1000.0)).astype(np.int64) * audio.channels
+    expected = np.diff(bounds)
+    bounds = np.minimum(bounds, len(samples))
+
+    sums = np.empty(len(expected))
+    for i in range(0, len(expected), ENERGY_BATCH_CHUNKS):
+        b = bounds[i:i + ENERGY_BATCH_CHUNKS + 1]
+        squares = np.square(samples[b[0]:b[-1]], dtype=np.float64)
+        cumsum = np.concatenate(([0.0], np.cumsum(squares)))
+        sums[i:i + len(b) - 1] = np.diff(cumsum[b - b[0]])
+    return np.divide(sums, expected, out=np.zeros_like(sums), where=expected > 0)
+
+def _leading_silent_ms(audio: AudioSegment, energies, silence_threshold, chunk_size):
+    # 第一个非静音块之前的毫秒数，全部静音时为整段时长
+    # dBFS 阈值 -> 均方能量阈值
+    max_amplitude = float(1 << (8 * audio.sample_width - 1))
+    cutoff = (max_amplitude * 10 ** (silence_threshold / 20)) ** 2
+    loud = energies >= cutoff
+    if not loud.any():
+        return len(audio)
+    return min(int(np.argmax(loud)) * chunk_size, len(audio))
+
+def detect_leading_silence(audio: AudioSegment, silence_threshold=-40, chunk_size=10):
+    # 返回开头静音的毫秒数（同 pydub.silence.detect_leading_silence）
+    energies = _chunk_energies(audio, chunk_size)
+    return _leading_silent_ms(audio, energies, silence_threshold, chunk_size)
+
+def detect_trailing_silence(audio: AudioSegment, silence_threshold=-40, chunk_size=10):
+    # 返回结尾静音的毫秒数，等价于 detect_leading_silence(audio.reverse())，但不复制音频
+    energies = _chunk_energies(audio, chunk_size, from_end=True)
+    return _leading_silent_ms(audio, energies, silence_threshold, chunk_size)
 
 def trim_silence(audio: AudioSegment, silence_threshold=-40, chunk_size=10):
     # 返回去除前后静音的音频
-    start_trim = silence.detect_leading_silence(audio, silence_threshold=silence_threshold, chunk_size=chunk_size)
-    end_trim = silence.detect_leading_silence(audio.reverse(), silence_threshold=silence_threshold, chunk_size=chunk_size)
     duration = len(audio)
-    return audio[start_trim:duration-end_trim]
+    lead = detect_leading_silence(audio, silence_threshold, chunk_size)
+    if lead >= duration:
+        return audio[0:0]
+    tail = detect_trailing_silence(audio, silence_threshold, chunk_size)
+    return audio[lead:duration - tail]
 
 async def synthesize(text, voice="zh-CN-YunjianNeural", rate="+0%", volume="+0%"):
     communicate = edge_tts.Communicate(text, voice=voice, rate=rate, volume=volume)
@@ -66,44 +129,87 @@ async def synthesize(text, voice="zh-CN-YunjianNeural", rate="+0%", volume="+0%"
             mp3_bytes += chunk["data"]
     return AudioSegment.from_file(io.BytesIO(mp3_bytes), format="mp3")
 
-def get_duration_ms(td):
-    return int(td.total_seconds() * 1000)
+async def srt_to_voice(srt_path, out_path, voice="zh-CN-YunjianNeural", concurrency=8):
+    if concurrency < 1:
+        # Semaphore(0) 会让所有合成请求永远等待
+        raise ValueError(f"concurrency 必须 >= 1: {concurrency}")
 
-async def srt_to_voice(srt_path, out_path, voice="zh-CN-YunjianNeural"):
     with open(srt_path, encoding="utf-8") as f:
-        subs = list(srt.parse(f.read()))
-
-    audio_segments = []
-    last_end = timedelta(seconds=0)
-
-    for idx, sub in enumerate(subs, 1):
-        print(f"\r正在合成配音：{idx}/{len(subs)}", end="", flush=True)
-        # 1. 静音填充
-        if sub.start > last_end:
-            gap = sub.start - last_end
-            audio_segments.append(AudioSegment.silent(duration=get_duration_ms(gap)))
-
-        # 2. 合成语音
-        text = sub.content.replace("\n", " ")
-        seg = await synthesize(text, voice=voice)
-        target_len = get_duration_ms(sub.end - sub.start)
-        print(f" (目标时长: {target_len}ms, 合成时长: {len(seg)}ms)")
-
-        # 3. 加速/减速
-        if len(seg) > target_len:
-            # 先去除前后静音再加速
-            seg = trim_silence(seg)
-            seg = ffmpeg_speedup(seg, speed=len(seg)/target_len)
-            seg = seg[:target_len]
+        subs = sorted(parse(f.read()), key=lambda x: x[0])
+
+    if not subs:
+        print("没有找到有效的字幕")
+        return
+
+    # 1. 并发合成语音，最多 concurrency 个请求同时进行
+    sem = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def worker(content):
+        nonlocal done
+        text = content.replace("\n", " ")
+        async with sem:
+            seg = await synthesize(text, voice=voice)
+        done += 1
+        print(f"\r正在合成配音：{done}/{len(subs)}", end="", flush=True)
+        return seg
+
+    # gather 按传入顺序返回结果
+    synthesized = await asyncio.gather(*(worker(content) for _, _, content in subs))
+    print()
+
+    # 2. 每条字幕占用从开始时间到下一条开始时间的时长，在 ffmpeg 中变速、截断并补静音
+    # 片段写入临时 wav 文件（pydub 直接写 wav，无需启动 ffmpeg），由 amovie 读入
+    frame_rate = synthesized[0].frame_rate
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        sources = []
+        if subs[0][0] > 0:
+            sources.append(silence_source(subs[0][0], frame_rate))
+
+        for idx, ((start_ms, end_ms, _), seg) in enumerate(zip(subs, synthesized), 1):
+            target_len = end_ms - start_ms
+            print(f"字幕 {idx}/{len(subs)} (目标时长: {target_len}ms, 合成时长: {len(seg)}ms)")
+
+            next_start = subs[idx][0] if idx < len(subs) else end_ms
+            slot = next_start - start_ms
+            if slot <= 0:
+                # 与下一条字幕同时开始，没有可用时长
+                continue
+            if target_len <= 0:
+                sources.append(silence_source(slot, frame_rate))
+                continue
+
+            filters = []
+            # 3. 加速
+            if len(seg) > target_len:
+                # 先去除前后静音再加速
+                seg = trim_silence(seg)
+                if len(seg) > 0:
+                    filters.append(atempo_filter(len(seg) / target_len))
+            # 不超过字幕时长，不足部分补静音到下一条字幕开始
+            filters.append(f"atrim=end={min(target_len, slot) / 1000}")
+            filters.append(f"apad=whole_dur={slot / 1000}")
+
+            clip = os.path.join(temp_dir, f"clip{idx}.wav")
+            seg.export(clip, format="wav").close()
+            sources.append(f"amovie={escape_filter_path(clip)}," + ",".join(filters))
+
+        # 4. 合并所有片段，片段过多时分批合成后再拼接
+        if len(sources) <= MAX_CLIPS_PER_PASS:
+            concat_sources(sources, out_path, temp_dir, "filter")
         else:
-            seg = seg + AudioSegment.silent(duration=target_len - len(seg))
-
-        audio_segments.append(seg)
-        last_end = sub.end
+            parts = []
+            for i in range(0, len(sources), MAX_CLIPS_PER_PASS):
+                part = os.path.join(temp_dir, f"part{len(parts)}.wav")
+                concat_sources(sources[i:i + MAX_CLIPS_PER_PASS], part, temp_dir, f"filter{len(parts)}")
+                parts.append(part)
+            sources = [f"amovie={escape_filter_path(part)}" for part in parts]
+            concat_sources(sources, out_path, temp_dir, "filter")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-    # 4. 合并所有片段
-    final_audio = sum(audio_segments, AudioSegment.silent(duration=0))
-    final_audio.export(out_path, format="wav")
     print(f"已保存配音到: {out_path}")
 
 def main():
@@ -111,10 +217,13 @@ def main():
     parser.add_argument("srt", help="输入 SRT 文件")
     parser.add_argument("-o", "--output", default=None, help="输出音频文件（默认同名 .wav）")
     parser.add_argument("--voice", default="zh-CN-XiaoxiaoNeural", help="edge-tts 语音名")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的 edge-tts 合成请求数，默认 8")
     args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency 必须 >= 1")
 
     out_path = args.output or os.path.splitext(args.srt)[0] + ".wav"
-    asyncio.run(srt_to_voice(args.srt, out_path, voice=args.voice))
+    asyncio.run(srt_to_voice(args.srt, out_path, voice=args.voice, concurrency=args.concurrency))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file